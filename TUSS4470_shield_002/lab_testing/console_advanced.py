@@ -2,9 +2,15 @@ import sys
 import numpy as np
 import serial
 import serial.tools.list_ports
-import struct
 import time
 
+from packet_reader import PacketReader
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
 # --- Configuration ---
 BAUD_RATE = 250000
 #NUM_SAMPLES = 1800  # Number of frequency/amplitude bins (X-axis)
@@ -20,6 +26,90 @@ SPEED_OF_SOUND = 330
 SAMPLE_TIME = 13.2e-6
 SAMPLE_RESOLUTION = (SPEED_OF_SOUND * SAMPLE_TIME * 100) / 2
 
+# Precomputed console separators
+SEP_HEAVY = "=" * 100
+SEP_LIGHT = "-" * 100
+
+_TIME_CACHE = (0, "")
+
+def _timestamp():
+    """Cache the formatted time per second; strftime is costly at packet rate."""
+    global _TIME_CACHE
+    now = int(time.time())
+    if now != _TIME_CACHE[0]:
+        _TIME_CACHE = (now, time.strftime('%H:%M:%S'))
+    return _TIME_CACHE[1]
+
+
+# --- Consistency Kernels ---
+# The dilated peak masks are packed into uint64 bitmap words (SWAR): with
+# NUM_SAMPLES=900 a mask is 15 words, so AND-reducing the history costs a
+# few dozen register-width ANDs instead of touching 900 bytes per frame.
+# With numba installed the kernels compile to single fused passes; the
+# NumPy versions below do the same job via packbits/unpackbits.
+
+if numba is not None:
+    @numba.njit(cache=True, boundscheck=False)
+    def _dilate_pack_into(values, threshold, tolerance, out):
+        """Threshold values, dilate by +/- tolerance and pack bits into out."""
+        n = values.shape[0]
+        nw = out.shape[0]
+        # Pack the thresholded peak bits, 64 samples per word
+        for w in range(nw):
+            word = np.uint64(0)
+            base = w * 64
+            top = 64 if base + 64 <= n else n - base
+            for b in range(top):
+                if values[base + b] >= threshold:
+                    word |= np.uint64(1) << np.uint64(b)
+            out[w] = word
+        # Dilate by OR-ing shifted copies; carry bits cross word boundaries
+        src = out.copy()
+        for w in range(nw):
+            word = src[w]
+            lo = src[w - 1] if w > 0 else np.uint64(0)
+            hi = src[w + 1] if w < nw - 1 else np.uint64(0)
+            for s in range(1, tolerance + 1):
+                us = np.uint64(s)
+                inv = np.uint64(64 - s)
+                word |= (src[w] << us) | (lo >> inv)
+                word |= (src[w] >> us) | (hi << inv)
+            out[w] = word
+
+    @numba.njit(cache=True, boundscheck=False)
+    def _consistent_into(values, past, threshold, out):
+        """out[i] = values[i] >= threshold and every past bitmap set at i."""
+        n = values.shape[0]
+        frames = past.shape[0]
+        nw = past.shape[1]
+        for w in range(nw):
+            word = ~np.uint64(0)
+            for f in range(frames):
+                word &= past[f, w]
+            base = w * 64
+            top = 64 if base + 64 <= n else n - base
+            for b in range(top):
+                bit = (word >> np.uint64(b)) & np.uint64(1)
+                out[base + b] = bit != np.uint64(0) and values[base + b] >= threshold
+else:
+    def _dilate_pack_into(values, threshold, tolerance, out):
+        """Threshold values, dilate by +/- tolerance and pack bits into out."""
+        mask = (values >= threshold).astype(np.uint8)
+        window = np.ones(2 * tolerance + 1, dtype=np.uint8)
+        dilated = np.convolve(mask, window, 'same') > 0
+        packed = np.packbits(dilated, bitorder='little')
+        buf = np.zeros(out.shape[0] * 8, dtype=np.uint8)
+        buf[:packed.size] = packed
+        out[:] = buf.view(np.uint64)
+
+    def _consistent_into(values, past, threshold, out):
+        """out[i] = values[i] >= threshold and every past bitmap set at i."""
+        words = np.bitwise_and.reduce(past, axis=0) if past.shape[0] else None
+        np.greater_equal(values, threshold, out=out)
+        if words is not None:
+            bits = np.unpackbits(words.view(np.uint8), bitorder='little')
+            np.logical_and(out, bits[:values.shape[0]], out=out)
+
 
 # --- Signal Tracker Class for Time-Series Analysis ---
 
@@ -28,113 +118,48 @@ class SignalTracker:
     Manages a buffer of past sample arrays and identifies consistent signal indices.
     """
     def __init__(self, buffer_size, threshold, tolerance):
-        self.buffer = []
         self.buffer_size = buffer_size
         self.threshold = threshold
         self.tolerance = tolerance
+        # Past frames live in a fixed ring of already tolerance-dilated peak
+        # masks, bit-packed into uint64 words (NUM_SAMPLES bits rounded up to
+        # a word boundary). A frame is dilated and packed exactly once, when
+        # it is inserted, and the ring row is reused in place.
+        words = (NUM_SAMPLES + 63) // 64
+        self._past = np.zeros((buffer_size - 1, words), dtype=np.uint64)
+        self._ring_idx = 0
+        self._filled = 0
+        self._consistent_mask = np.empty(NUM_SAMPLES, dtype=bool)
         # Holds the indices that were consistent in the last analysis
-        self.consistent_indices = set() 
+        self.consistent_indices = set()
 
     def update_and_get_consistent_indices(self, current_values):
         """
-        Adds current samples to the buffer, analyzes consistency, and returns 
+        Adds current samples to the buffer, analyzes consistency, and returns
         the indices of consistently appearing peaks.
         """
-        # 1. Identify current 'peak' indices (above threshold)
-        current_peak_indices = np.where(current_values >= self.threshold)[0]
-        
-        # 2. Update buffer
-        self.buffer.append(current_peak_indices)
-        if len(self.buffer) > self.buffer_size:
-            self.buffer.pop(0)
+        past_frames = self._past.shape[0]
 
-        # Skip analysis until the buffer is full
-        if len(self.buffer) < self.buffer_size:
+        # 1. Analyze Consistency against the buffered (pre-dilated) past masks.
+        # A current peak is consistent if every past frame has a peak within
+        # +/- tolerance of it, i.e. if every dilated past mask is set there.
+        if self._filled < past_frames:
+            # Not enough history yet - just record this frame below
             self.consistent_indices = set()
-            return self.consistent_indices
-        
-        # 3. Analyze Consistency across all buffered samples
-        # Use a dictionary to count how many times an index is part of a cluster
-        index_counts = {}
-
-        # The core idea: Iterate through the latest peaks and check for neighbours in the history.
-        for index in current_peak_indices:
-            
-            is_consistent = True
-            
-            # Check this index against ALL previous buffers
-            for past_peak_indices in self.buffer[:-1]:
-                
-                # Check if any past peak falls within the tolerance range [index-tol, index+tol]
-                min_idx = max(0, index - self.tolerance)
-                max_idx = min(NUM_SAMPLES - 1, index + self.tolerance)
-                
-                # Check if the set of past peaks intersects the allowed range
-                is_match = False
-                for p_idx in past_peak_indices:
-                    if min_idx <= p_idx <= max_idx:
-                        is_match = True
-                        break
-                
-                if not is_match:
-                    is_consistent = False
-                    break # Break out of past_peak_indices loop
-
-            if is_consistent:
-                # If consistent across all past frames, this index is significant.
-                # We use the current index as the canonical consistent position.
-                index_counts[index] = index_counts.get(index, 0) + 1
-        
-        # 4. Final selection: indices that passed the check
-        # Since we broke the inner loop on failure, the result set is already 'consistent'.
-        self.consistent_indices = set(index_counts.keys())
+        else:
+            _consistent_into(current_values, self._past, self.threshold, self._consistent_mask)
+            self.consistent_indices = set(np.flatnonzero(self._consistent_mask).tolist())
+
+        # 2. Update the ring: threshold + dilate + bit-pack the new frame
+        # straight into the row that currently holds the oldest mask
+        if past_frames:
+            _dilate_pack_into(current_values, self.threshold, self.tolerance, self._past[self._ring_idx])
+            self._ring_idx = (self._ring_idx + 1) % past_frames
+            if self._filled < past_frames:
+                self._filled += 1
         return self.consistent_indices
 
 
-# --- Core Packet Reading Function (Unchanged) ---
-
-def read_packet(ser):
-    """
-    Reads a single, verified packet from the serial port.
-    """
-    payload_len = 6 + 2 * NUM_SAMPLES
-    
-    # ... [Same read_packet implementation as before, returning values, depth_cm, temperature, drive_voltage] ...
-    while True:
-        # 1. Wait for Header
-        header = ser.read(1)
-        if header != b'\xAA':
-            continue
-
-        # 2. Read Payload and Checksum
-        payload = ser.read(payload_len)
-        checksum = ser.read(1)
-
-        if len(payload) != payload_len or len(checksum) != 1:
-            continue
-
-        # 3. Verify Checksum
-        calc_checksum = 0
-        for byte in payload:
-            calc_checksum ^= byte
-
-        if calc_checksum != checksum[0]:
-            # print(f"⚠️ Checksum mismatch! Calculated: {calc_checksum:02X}, Received: {checksum[0]:02X}")
-            continue
-
-        # 4. Unpack Payload and Samples
-        depth_index, temp_scaled, vDrv_scaled = struct.unpack(">HhH", payload[:6])
-        samples = struct.unpack(f">{NUM_SAMPLES}H", payload[6:])
-
-        # 5. Scale and Calculate Real Values
-        depth_cm = depth_index * SAMPLE_RESOLUTION
-        temperature = temp_scaled / 100.0
-        drive_voltage = vDrv_scaled / 100.0
-        values = np.array(samples, dtype=np.uint16)
-
-        return values, depth_cm, temperature, drive_voltage
-
-
 # --- Main Execution Loop ---
 
 def run_serial_console(port, baud_rate):
@@ -145,43 +170,51 @@ def run_serial_console(port, baud_rate):
     # Set numpy to print the full array without truncation
     np.set_printoptions(threshold=NUM_SAMPLES + 10, linewidth=200)
     
-    # Initialize the Signal Tracker
+    # Initialize the Signal Tracker and buffered packet parser
     tracker = SignalTracker(CONSISTENCY_SAMPLES, THRESHOLD, POSITION_TOLERANCE)
+    reader = PacketReader(NUM_SAMPLES, SAMPLE_RESOLUTION)
 
     try:
         with serial.Serial(port, baud_rate, timeout=1) as ser:
             print(f"✅ Connected to {port}. Reading data...")
-            
+
             while True:
-                result = read_packet(ser)
+                result = reader.read_packet(ser)
                 
                 if result:
-                    values, depth_cm, temperature, drive_voltage = result
+                    values, depth_index, depth_cm, temperature, drive_voltage = result
                     
                     # 1. Get Consistent Indices
                     consistent_indices = tracker.update_and_get_consistent_indices(values)
                     
                     # 2. Create Highlighted String
-                    highlighted_samples = []
-                    for i, value in enumerate(values):
-                        if i in consistent_indices and value >= THRESHOLD:
-                            # Highlight: Show value for consistent, high-value data
-                            highlighted_samples.append(f"{value:4d}") 
-                        elif value >= THRESHOLD:
-                            # Show a marker for high-value but inconsistent data
-                            highlighted_samples.append(" .  ") 
-                        else:
-                            # Show a dot for low-value data (below threshold)
-                            highlighted_samples.append("    ") 
-
-                    samples_output = "".join(highlighted_samples)
+                    # Format every sample in one C loop with np.char.mod, then
+                    # select per cell: consistent peaks show their value, other
+                    # peaks a marker, everything else stays blank
+                    high_mask = values >= THRESHOLD
+                    if consistent_indices:
+                        consistent_mask = np.zeros(NUM_SAMPLES, dtype=bool)
+                        consistent_mask[list(consistent_indices)] = True
+                        cons_strs = np.char.mod('%4d', values)
+                        cells = np.where(high_mask & consistent_mask, cons_strs,
+                                         np.where(high_mask, " .  ", "    "))
+                    else:
+                        cells = np.where(high_mask, " .  ", "    ")
+
+                    samples_output = "".join(cells.tolist())
                     
                     # --- CONSOLE OUTPUT ---
-                    print("\n" + "=" * 100)
-                    print(f"Time: {time.strftime('%H:%M:%S')} | Depth: {depth_cm:.1f} cm | Temp: {temperature:.1f} °C | Vdrv: {drive_voltage:.1f} V")
-                    print("-" * 100)
-                    print(f"Consistent Peaks (Value shown) | Inconsistent Peaks (*) | Background (.)")
-                    print(samples_output)
+                    # Assemble the whole frame and write it in one go: one
+                    # stdout lock + flush per packet instead of five
+                    out = (
+                        f"\n{SEP_HEAVY}\n"
+                        f"Time: {_timestamp()} | Depth: {depth_cm:.1f} cm | Temp: {temperature:.1f} °C | Vdrv: {drive_voltage:.1f} V\n"
+                        f"{SEP_LIGHT}\n"
+                        "Consistent Peaks (Value shown) | Inconsistent Peaks (*) | Background (.)\n"
+                        f"{samples_output}\n"
+                    )
+                    sys.stdout.write(out)
+                    sys.stdout.flush()
                 
     except serial.SerialException as e:
         print(f"\n❌ Serial Port Error: {e}")
@@ -2,10 +2,11 @@ import sys
 import numpy as np
 import serial
 import serial.tools.list_ports
-import struct
 import time
 import socket # Kept socket import for utility functions, though not strictly needed for core logic
 
+from packet_reader import PacketReader
+
 # --- Configuration (Kept from Original) ---
 BAUD_RATE = 250000
 NUM_SAMPLES = 1800  # Number of frequency/amplitude bins (X-axis)
@@ -17,63 +18,15 @@ SAMPLE_RESOLUTION = (SPEED_OF_SOUND * SAMPLE_TIME * 100) / 2  # cm per row
 PACKET_SIZE = 1 + 6 + 2 * NUM_SAMPLES + 1 # header + payload + checksum
 
 
-# --- Core Packet Reading Function (Simplified) ---
-
-def read_packet(ser):
-    """
-    Reads a single, verified packet from the serial port.
-    Returns unpacked sensor data and sample array, or None if reading fails.
-    """
-    while True:
-        # 1. Wait for Header
-        header = ser.read(1)
-        if header != b'\xAA':
-            continue
-
-        # 2. Read Payload and Checksum
-        payload_len = 6 + 2 * NUM_SAMPLES
-        payload = ser.read(payload_len)
-        checksum = ser.read(1)
-
-        if len(payload) != payload_len or len(checksum) != 1:
-            print("⚠️ Incomplete packet read. Retrying...")
-            continue
-
-        # 3. Verify Checksum
-        calc_checksum = 0
-        for byte in payload:
-            calc_checksum ^= byte
-
-        if calc_checksum != checksum[0]:
-            print(f"⚠️ Checksum mismatch! Calculated: {calc_checksum:02X}, Received: {checksum[0]:02X}")
-            continue
-
-        # 4. Unpack Payload
-        # >HhH: Big-Endian Unsigned Short (2B), Signed Short (2B), Unsigned Short (2B)
-        depth_index, temp_scaled, vDrv_scaled = struct.unpack(">HhH", payload[:6])
-        
-        # Clamp depth (NUM_SAMPLES constant doesn't strictly exist here, but we use depth_index for clarity)
-        # Note: We skip the clamping line for simplicity as 'NUM_SAMPLES' is the effective max.
-
-        # 5. Unpack Samples (The main data array)
-        # >{NUM_SAMPLES}H: Big-Endian Unsigned Short for the rest of the payload
-        samples = struct.unpack(f">{NUM_SAMPLES}H", payload[6:])
-
-        # 6. Scale and Calculate Real Values
-        depth_cm = depth_index * SAMPLE_RESOLUTION
-        temperature = temp_scaled / 100.0
-        drive_voltage = vDrv_scaled / 100.0
-        values = np.array(samples)
-
-        return values, depth_cm, temperature, drive_voltage
-
-
 # --- Main Execution Loop ---
 
 def run_serial_console(port, baud_rate):
     """Initializes serial connection and starts continuous reading."""
     print(f"Attempting to connect to: {port} @ {baud_rate} baud...")
     
+    # Buffered packet parser (drains the OS buffer in one read per call)
+    reader = PacketReader(NUM_SAMPLES, SAMPLE_RESOLUTION)
+
     try:
         # Use 'with' to ensure the serial port is closed properly
         with serial.Serial(port, baud_rate, timeout=1) as ser:
@@ -81,14 +34,14 @@ def run_serial_console(port, baud_rate):
             print("-" * 50)
 
             while True:
-                result = read_packet(ser)
+                result = reader.read_packet(ser)
                 
                 if result:
-                    values, depth_cm, temperature, drive_voltage = result
-                    
+                    values, depth_index, depth_cm, temperature, drive_voltage = result
+
                     # --- CONSOLE OUTPUT ---
                     print(f"Time: {time.strftime('%H:%M:%S')}")
-                    print(f"Depth: {depth_cm:.1f} cm | Index: {int(depth_cm / SAMPLE_RESOLUTION)}")
+                    print(f"Depth: {depth_cm:.1f} cm | Index: {depth_index}")
                     print(f"Temp: {temperature:.1f} °C | Vdrv: {drive_voltage:.1f} V")
                     
                     # Print a slice of the raw data (e.g., the first 10 values)
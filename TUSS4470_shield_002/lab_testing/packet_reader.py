@@ -0,0 +1,139 @@
+import array
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    # The parser stays usable without NumPy (e.g. a bare Pi install): the
+    # checksum falls back to the SWAR qword loop below and samples come
+    # back as a plain tuple instead of an ndarray.
+    np = None
+
+try:
+    # Optional compiled parser (see setup_parse_packet.py): checksum,
+    # header and sample decode fused into one C pass
+    from parse_packet import parse_packet as _parse_packet_c
+except ImportError:
+    _parse_packet_c = None
+
+# Packet layout: 0xAA header byte | 6-byte info block | NUM_SAMPLES
+# big-endian uint16 samples | 1-byte XOR checksum over the payload.
+HEADER_BYTE = 0xAA
+
+# Compiled once at import: struct.unpack() with a literal format string
+# re-parses the format on every call, Struct objects cache it.
+# >HhH: Big-Endian Unsigned Short, Signed Short, Unsigned Short
+_HDR = struct.Struct(">HhH")
+
+
+def _xor_checksum(payload):
+    """XOR-reduce the payload to one byte."""
+    if np is not None:
+        # Vectorized XOR reduction over a zero-copy view of the payload
+        return int(np.bitwise_xor.reduce(np.frombuffer(payload, dtype=np.uint8)))
+    # Pure-Python SWAR fallback: XOR 8 bytes at a time as qwords (~8x fewer
+    # interpreter iterations than a per-byte loop), then fold to one byte
+    qwords = array.array('Q')
+    qwords.frombytes(payload + b'\x00' * (-len(payload) % 8))
+    acc = 0
+    for q in qwords:
+        acc ^= q
+    acc ^= acc >> 32
+    acc ^= acc >> 16
+    acc ^= acc >> 8
+    return acc & 0xFF
+
+
+class PacketReader:
+    """
+    Buffered packet parser for the TUSS4470 serial stream.
+
+    The old read_packet() issued three ser.read() syscalls per packet
+    (header byte, payload, checksum) and scanned for the header one byte
+    at a time. Instead, drain everything the OS has buffered in a single
+    read into a local bytearray and parse packets out of that, so the
+    kernel buffer stays empty and we do ~one syscall per packet.
+    """
+
+    def __init__(self, num_samples, sample_resolution):
+        self.num_samples = num_samples
+        self.sample_resolution = np.float32(sample_resolution) if np is not None else sample_resolution
+        self.payload_len = 6 + 2 * num_samples
+        self.packet_size = 1 + self.payload_len + 1  # header + payload + checksum
+        self._buf = bytearray()
+        # Sample-block format compiled once per reader (only used when the
+        # NumPy decode path is unavailable)
+        self._samples_struct = struct.Struct(f">{num_samples}H")
+
+    def feed(self, data):
+        """Append raw bytes to the parse buffer (for callback-style readers)."""
+        self._buf += data
+
+    def read_packet(self, ser):
+        """
+        Return the next verified packet, or None if no complete packet is
+        available yet. Packets already sitting in the parse buffer are
+        handed out first; only when the buffer is exhausted does this
+        block on ser.read() (at most for the port's configured timeout).
+        """
+        packet = self.next_packet()
+        if packet is not None:
+            return packet
+        chunk = ser.read(max(self.packet_size, ser.in_waiting))
+        if chunk:
+            self._buf += chunk
+        return self.next_packet()
+
+    def next_packet(self):
+        """
+        Parse the next verified packet out of the buffer.
+        Returns (values, depth_index, depth_cm, temperature, drive_voltage)
+        or None. depth_index is the raw row index from the device; callers
+        that display it should use it directly rather than dividing depth_cm
+        back down by the sample resolution.
+        """
+        buf = self._buf
+        while True:
+            start = buf.find(HEADER_BYTE)
+            if start < 0:
+                # No header anywhere - everything buffered is junk
+                buf.clear()
+                return None
+            if len(buf) - start < self.packet_size:
+                # Header found but the packet is still incomplete
+                if start:
+                    del buf[:start]
+                return None
+
+            payload = bytes(buf[start + 1:start + 1 + self.payload_len])
+            recv_checksum = buf[start + self.packet_size - 1]
+
+            if _parse_packet_c is not None:
+                parsed = _parse_packet_c(payload, self.num_samples, recv_checksum)
+                if parsed is None:
+                    # 0xAA inside a packet body, not a real header - resync one byte on
+                    del buf[:start + 1]
+                    continue
+                depth_index, temp_scaled, vDrv_scaled, values = parsed
+                del buf[:start + self.packet_size]
+            else:
+                if _xor_checksum(payload) != recv_checksum:
+                    # 0xAA inside a packet body, not a real header - resync one byte on
+                    del buf[:start + 1]
+                    continue
+
+                del buf[:start + self.packet_size]
+
+                depth_index, temp_scaled, vDrv_scaled = _HDR.unpack_from(payload, 0)
+                if np is not None:
+                    # Zero-copy view of the sample block + one bulk byteswap
+                    # (big-endian -> host order)
+                    raw = np.frombuffer(payload, dtype=np.uint16, count=self.num_samples, offset=6)
+                    values = raw.byteswap().view(np.uint16)
+                else:
+                    values = self._samples_struct.unpack_from(payload, 6)
+
+            depth_cm = depth_index * self.sample_resolution
+            temperature = temp_scaled / 100.0
+            drive_voltage = vDrv_scaled / 100.0
+            return values, depth_index, depth_cm, temperature, drive_voltage
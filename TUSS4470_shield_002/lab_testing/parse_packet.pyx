@@ -0,0 +1,94 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+C implementation of the hot packet-parse path: XOR checksum over the
+payload, header decode and big-endian -> host sample decode in one call.
+
+Build in place with:
+
+    python setup_parse_packet.py build_ext --inplace
+
+PacketReader picks the compiled module up automatically and falls back
+to the NumPy/struct path when it is not importable.
+"""
+
+import numpy as np
+
+cdef extern from *:
+    """
+    #include <stdint.h>
+    #include <string.h>
+
+    #if defined(__GNUC__) || defined(__clang__)
+    #define PP_BSWAP16(x) __builtin_bswap16(x)
+    #else
+    static inline uint16_t PP_BSWAP16(uint16_t x) { return (uint16_t)((x << 8) | (x >> 8)); }
+    #endif
+
+    /* Big-endian -> host copy of n uint16 values. The unaligned loads go
+     * through memcpy and the swap through the bswap16 builtin, which GCC
+     * and Clang vectorize at -O3 into pshufb on x86 / rev16 on ARM NEON,
+     * swapping 8-16 lanes per instruction. */
+    static void pp_bswap16_copy(const uint8_t *src, uint16_t *dst, Py_ssize_t n)
+    {
+        Py_ssize_t i;
+        uint16_t v;
+        for (i = 0; i < n; i++) {
+            memcpy(&v, src + 2 * i, 2);
+            dst[i] = PP_BSWAP16(v);
+        }
+    }
+
+    /* XOR-reduce n bytes to one. The qword loop consumes 8 bytes per
+     * iteration and auto-vectorizes at -O3 into pxor/vpxor on x86 and
+     * veorq on NEON; the tail bytes and the final fold stay scalar. */
+    static uint8_t pp_xor_checksum(const uint8_t *p, Py_ssize_t n)
+    {
+        uint64_t acc = 0;
+        uint64_t v;
+        uint8_t tail = 0;
+        Py_ssize_t i = 0;
+        for (; i + 8 <= n; i += 8) {
+            memcpy(&v, p + i, 8);
+            acc ^= v;
+        }
+        for (; i < n; i++)
+            tail ^= p[i];
+        acc ^= acc >> 32;
+        acc ^= acc >> 16;
+        acc ^= acc >> 8;
+        return (uint8_t)(tail ^ (acc & 0xFF));
+    }
+    """
+    void pp_bswap16_copy(const unsigned char *src, unsigned short *dst, Py_ssize_t n) nogil
+    unsigned char pp_xor_checksum(const unsigned char *p, Py_ssize_t n) nogil
+
+
+def parse_packet(const unsigned char[::1] payload, Py_ssize_t num_samples,
+                 unsigned char expected_checksum):
+    """
+    Validate and decode one payload (6-byte header + num_samples big-endian
+    uint16 samples). Returns (depth_index, temp_scaled, vdrv_scaled, samples)
+    or None if the XOR checksum does not match expected_checksum.
+    """
+    cdef Py_ssize_t n = payload.shape[0]
+    cdef unsigned char checksum
+
+    with nogil:
+        checksum = pp_xor_checksum(&payload[0], n)
+    if checksum != expected_checksum:
+        return None
+
+    # Header fields (big-endian): uint16 depth index, int16 scaled
+    # temperature, uint16 scaled drive voltage
+    cdef int depth_index = (payload[0] << 8) | payload[1]
+    cdef int temp_scaled = (payload[2] << 8) | payload[3]
+    if temp_scaled >= 32768:
+        temp_scaled -= 65536
+    cdef int vdrv_scaled = (payload[4] << 8) | payload[5]
+
+    samples = np.empty(num_samples, dtype=np.uint16)
+    cdef unsigned short[::1] out = samples
+    with nogil:
+        pp_bswap16_copy(&payload[6], &out[0], num_samples)
+
+    return depth_index, temp_scaled, vdrv_scaled, samples
@@ -1,9 +1,24 @@
+import asyncio
 import sys
 import numpy as np
 import serial
 import serial.tools.list_ports
-import struct
-import time
+
+try:
+    import serial_asyncio_fast as serial_asyncio
+except ImportError:
+    # pyserial-asyncio ships the same API, just without the eager-read path
+    import serial_asyncio
+
+from packet_reader import PacketReader
+
+# Optional Linux-only io_uring read path (pip install liburing)
+UringSerialReader = None
+if sys.platform == "linux":
+    try:
+        from uring_serial import UringSerialReader
+    except ImportError:
+        pass
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QLabel, QHBoxLayout
 from PyQt5.QtCore import QThread, pyqtSignal, Qt
 from PyQt5.QtGui import QKeySequence
@@ -18,6 +33,11 @@ NUM_SAMPLES = 1800  # Number of frequency/amplitude bins (Y-axis now)
 PLOT_WIDTH = 1280  # Number of time steps (X-axis)
 PLOT_HEIGHT = 860 # Height of the window for fitting the plot
 
+# Batch packets in the serial thread so the GUI does one setImage per
+# screen refresh instead of one per packet
+BATCH_PACKETS = 8
+BATCH_INTERVAL_MS = 16  # ~60 Hz display refresh
+
 # --- Data Conversion Constants (Retained) ---
 SPEED_OF_SOUND = 330
 SAMPLE_TIME = 13.2e-6
@@ -30,105 +50,173 @@ COLOR_LEVELS = (0, 150)
 DEFAULT_COLORMAP = 'viridis' 
 
 
-# --- Core Packet Reading Function (Retained) ---
+# --- Asyncio Serial Reading (runs inside a QThread) ---
 
-# --- Core Packet Reading Function (Modified for Robustness) ---
-
-def read_packet(ser):
+class EchoProtocol(asyncio.Protocol):
     """
-    Reads a single, verified packet from the serial port.
-    Returns unpacked sensor data and sample array, or None if reading fails.
+    Parses packets straight out of the event loop's data_received callback.
+    The loop wakes only when bytes actually arrive, replacing the old
+    in_waiting/sleep(0.001) polling cycle and its per-millisecond wakeups.
     """
-    payload_len = 6 + 2 * NUM_SAMPLES
-    
-    # Use a small read size for the header to avoid blocking long if timeout is large
-    header = ser.read(1) 
-    
-    # CHECK 1: Ensure we got a byte and it's the start marker
-    if header != b'\xAA':
-        # If we didn't get the header, clear the input buffer to prevent 
-        # reading an incomplete sequence on the next try.
-        if header:
-            # Only flush if some junk data was actually read
-            ser.reset_input_buffer()
-        return None 
-
-    # 2. Read Payload and Checksum
-    payload = ser.read(payload_len)
-    checksum = ser.read(1)
-
-    # CHECK 2: Ensure we read a complete packet
-    if len(payload) != payload_len or len(checksum) != 1:
-        # If incomplete, flush buffer and wait for a new packet start
-        ser.reset_input_buffer()
-        return None 
-
-    # 3. Verify Checksum
-    calc_checksum = 0
-    for byte in payload:
-        calc_checksum ^= byte
-
-    if calc_checksum != checksum[0]:
-        # Checksum failed, discard and wait for a new packet
-        ser.reset_input_buffer()
-        return None 
-
-    # 4. Unpack Payload and Samples
-    depth_index, temp_scaled, vDrv_scaled = struct.unpack(">HhH", payload[:6])
-    samples = struct.unpack(f">{NUM_SAMPLES}H", payload[6:])
-
-    # 5. Scale and Calculate Real Values
-    depth_cm = depth_index * SAMPLE_RESOLUTION
-    temperature = temp_scaled / 100.0
-    drive_voltage = vDrv_scaled / 100.0
-    values = np.array(samples, dtype=np.uint16)
-
-    return values, depth_cm, temperature, drive_voltage 
-
-# --- QThread for Serial Reading (Retained) ---
+
+    def __init__(self, reader_thread):
+        self.reader_thread = reader_thread
+        self.parser = PacketReader(NUM_SAMPLES, SAMPLE_RESOLUTION)
+        self.batch = np.empty((BATCH_PACKETS, NUM_SAMPLES), dtype=np.uint16)
+        self.count = 0
+        self.latest = (0.0, 0.0, 0.0)
+        self._loop = None
+        self._flush_handle = None
+
+    def connection_made(self, transport):
+        # Only the asyncio backend gets here; remember the loop so a
+        # partial batch can be flushed on a timer when the stream pauses
+        self._loop = asyncio.get_running_loop()
+
+    def data_received(self, data):
+        self.parser.feed(data)
+        while True:
+            result = self.parser.next_packet()
+            if result is None:
+                break
+            values, depth_index, depth_cm, temperature, drive_voltage = result
+            self.batch[self.count] = values
+            self.count += 1
+            self.latest = (depth_cm, temperature, drive_voltage)
+            if self.count == BATCH_PACKETS:
+                self._flush()
+        # A partial batch must not wait for the next data_received - if the
+        # stream pauses, those frames would never show. Flush it once a
+        # display refresh is due, whether or not more bytes arrive.
+        if self.count and self._loop is not None and self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(
+                BATCH_INTERVAL_MS / 1000, self.flush_pending
+            )
+
+    def flush_pending(self):
+        """Emit a buffered partial batch (timer/timeout driven)."""
+        self._flush_handle = None
+        if self.count:
+            self._flush()
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        depth_cm, temperature, drive_voltage = self.latest
+        # Cross-thread signal emission is queued by Qt, so this is safe here
+        self.reader_thread.data_received.emit(
+            self.batch[:self.count].copy(), depth_cm, temperature, drive_voltage
+        )
+        self.count = 0
+
+    def connection_lost(self, exc):
+        if exc is not None:
+            print(f"❌ Serial connection lost: {exc}")
+        self.reader_thread.stop_loop()
+
 
 class SerialReader(QThread):
+    # Emits a (n_packets, NUM_SAMPLES) batch plus the latest depth/temp/Vdrv
     data_received = pyqtSignal(np.ndarray, float, float, float)
 
     def __init__(self, port, baud_rate, parent=None): # Accept 'parent' argument
         super().__init__(parent)  # Pass 'parent' to the QThread initializer
         self.port = port
         self.baud_rate = baud_rate
-        self.running = True
+        self._loop = None
+        self._transport = None
+        self._running = True
 
     def run(self):
-        """Continuously read serial data and emit processed arrays."""
+        """Read the port through io_uring where available, asyncio otherwise."""
+        if UringSerialReader is None or not self._run_uring():
+            self._run_asyncio()
+
+    def _run_uring(self):
+        """
+        Blocking io_uring read loop (Linux-only, needs liburing).
+        Returns True once the io_uring backend has taken over the port;
+        False if setup failed and the asyncio reader should run instead.
+        """
         try:
-            # Use fixed timeout for non-blocking read
-            with serial.Serial(self.port, self.baud_rate, timeout=0.01) as ser: 
-                print(f"✅ Serial Thread connected to {self.port} at {self.baud_rate} baud.")
-                ser.reset_input_buffer() # Ensure a clean start to clear any prior junk
-                
-                # CRITICAL: Wait briefly for the device to initialize and send data
-                time.sleep(1.0) 
-                
-                while self.running:
-                    # Added a check to see if we have enough data bytes for a full packet
-                    # Note: ser.in_waiting is only a hint, not a guarantee
-                    if ser.in_waiting >= PACKET_SIZE:
-                        result = read_packet(ser)
-                    else:
-                        result = None
-
-                    if result:
-                        values, depth_cm, temperature, drive_voltage = result
-                        self.data_received.emit(values, depth_cm, temperature, drive_voltage)
-                    
-                    # Small sleep to prevent 100% CPU utilization
-                    time.sleep(0.001)
-                        
+            ser = serial.Serial(self.port, self.baud_rate)
+        except Exception as e:
+            print(f"⚠️ io_uring reader unavailable ({e}); falling back to asyncio.")
+            return False
+        try:
+            with ser:
+                try:
+                    uring = UringSerialReader(ser)
+                except Exception as e:
+                    print(f"⚠️ io_uring reader unavailable ({e}); falling back to asyncio.")
+                    return False
+                print(f"✅ Serial Thread connected to {self.port} at {self.baud_rate} baud (io_uring).")
+                # Reuse the protocol purely as the parse/batch/emit pipeline
+                protocol = EchoProtocol(self)
+                try:
+                    while self._running:
+                        chunk = uring.read(timeout=BATCH_INTERVAL_MS / 1000)
+                        if chunk is None:
+                            print("❌ Serial connection lost: port reported end-of-file.")
+                            break
+                        if chunk:
+                            protocol.data_received(chunk)
+                        else:
+                            # Read timed out - the stream has paused, so
+                            # push out any partially filled batch
+                            protocol.flush_pending()
+                finally:
+                    uring.close()
         except serial.SerialException as e:
             print(f"❌ SERIAL ERROR: Port '{self.port}' access failed. Check connection/permissions: {e}")
         except Exception as e:
             print(f"❌ An unexpected error occurred in the serial thread: {e}")
+        return True
+
+    def _run_asyncio(self):
+        """Run an asyncio loop that reads the port event-driven (no polling)."""
+        try:
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+
+            coro = serial_asyncio.create_serial_connection(
+                self._loop, lambda: EchoProtocol(self), self.port, baudrate=self.baud_rate
+            )
+            transport, protocol = self._loop.run_until_complete(coro)
+            self._transport = transport
+            print(f"✅ Serial Thread connected to {self.port} at {self.baud_rate} baud.")
+
+            self._loop.run_forever()
+        except serial.SerialException as e:
+            print(f"❌ SERIAL ERROR: Port '{self.port}' access failed. Check connection/permissions: {e}")
+        except Exception as e:
+            print(f"❌ An unexpected error occurred in the serial thread: {e}")
+        finally:
+            if self._loop is not None:
+                self._loop.close()
+
+    def stop_loop(self):
+        """
+        Shut the reader down from within the loop thread. The transport's
+        teardown runs on the loop (it flushes and closes the port
+        asynchronously), so it must be closed while the loop is still
+        running - closing after run_forever() returns leaks the port.
+        Closing it triggers connection_lost, which calls back in here to
+        actually stop the loop once the teardown has finished.
+        """
+        if self._transport is not None:
+            transport, self._transport = self._transport, None
+            if not transport.is_closing():
+                transport.close()  # connection_lost stops the loop
+                return
+        if self._loop is not None and self._loop.is_running():
+            self._loop.stop()
 
     def stop(self):
-        self.running = False
+        self._running = False
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self.stop_loop)
         self.quit()
         self.wait()
 
@@ -142,7 +230,14 @@ class SimpleWaterfallApp(QMainWindow):
         
         self.setGeometry(200, 200, PLOT_WIDTH + 240, PLOT_HEIGHT + 160) 
         
-        self.data = np.zeros((PLOT_WIDTH, NUM_SAMPLES), dtype=np.uint16) 
+        # Column-major (Fortran) layout: each incoming frame is one contiguous
+        # column, so the hot write self.data[:, idx] = samples is a straight
+        # memcpy and setImage can read the array without a transpose copy.
+        # uint8 is enough for display (COLOR_LEVELS tops out at 150) and
+        # halves the memory traffic through setImage and the colormap LUT.
+        self.data = np.zeros((NUM_SAMPLES, PLOT_WIDTH), dtype=np.uint8, order='F')
+        self._write_idx = 0  # next ring-buffer column to overwrite
+        self._clip_scratch = np.empty((BATCH_PACKETS, NUM_SAMPLES), dtype=np.uint16)
 
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -165,7 +260,11 @@ class SimpleWaterfallApp(QMainWindow):
         self.waterfall.getAxis("bottom").setLabel("Time (Frames)")
         
         self.waterfall.addItem(self.imageitem)
-        
+
+        # Hand the ring buffer to the ImageItem once: setImage stores a view,
+        # not a copy, so later in-place column writes only need a re-render
+        self.imageitem.setImage(self.data, autoLevels=False, levels=COLOR_LEVELS)
+
         # === Colorbar Setup ===
         self.colorbar = pg.HistogramLUTWidget()
         self.colorbar.setImageItem(self.imageitem)
@@ -202,18 +301,34 @@ class SimpleWaterfallApp(QMainWindow):
         else:
             super().keyPressEvent(event)
 
-    def update_plot(self, new_samples, depth_cm, temperature, drive_voltage):
+    def update_plot(self, batch, depth_cm, temperature, drive_voltage):
         """
-        Receives new samples from the serial thread and updates the scrolling plot.
+        Receives a batch of packets from the serial thread and updates the
+        scrolling plot with a single image upload.
         """
-        # 1. Scroll the plot data one column to the left
-        self.data = np.roll(self.data, -1, axis=0)
-        
-        # 2. Add the new sample array to the far right column
-        self.data[-1, :] = new_samples 
-        
-        # 3. Update the image in the plot
-        self.imageitem.setImage(self.data.T, autoLevels=False)
+        # 1. Quantize to uint8 at ingest (values above 255 saturate; the
+        # color scale only spans 0-150 anyway) and overwrite the oldest
+        # columns in-place. The scratch array avoids a per-batch allocation.
+        n = batch.shape[0]
+        clipped = self._clip_scratch[:n]
+        np.minimum(batch, 255, out=clipped)
+
+        end = self._write_idx + n
+        if end <= PLOT_WIDTH:
+            self.data[:, self._write_idx:end] = clipped.T
+        else:
+            # Batch wraps around the end of the ring
+            first = PLOT_WIDTH - self._write_idx
+            self.data[:, self._write_idx:] = clipped[:first].T
+            self.data[:, :end - PLOT_WIDTH] = clipped[first:].T
+        self._write_idx = end % PLOT_WIDTH
+
+        # 2. Re-render in place - once per batch, not per packet. The
+        # ImageItem already holds a view of self.data, so updateImage()
+        # skips setImage's new-image bookkeeping and the auto-level scan.
+        # The write cursor sweeps oscilloscope-style across the plot and
+        # wraps, which keeps the hot path free of any full-buffer copy.
+        self.imageitem.updateImage()
         
         # 4. Update info label
         self.info_label.setText(
@@ -0,0 +1,22 @@
+"""
+Builds the optional Cython packet parser next to the lab scripts:
+
+    python setup_parse_packet.py build_ext --inplace
+
+Needs Cython and a C compiler; everything keeps working without it.
+"""
+
+from setuptools import Extension, setup
+from Cython.Build import cythonize
+
+# -O3 lets GCC/Clang auto-vectorize the byteswap and checksum loops
+ext = Extension(
+    "parse_packet",
+    ["parse_packet.pyx"],
+    extra_compile_args=["-O3"],
+)
+
+setup(
+    name="parse_packet",
+    ext_modules=cythonize([ext]),
+)
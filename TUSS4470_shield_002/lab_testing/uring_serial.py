@@ -0,0 +1,94 @@
+"""
+Optional Linux-only backend that reads the serial port through io_uring.
+
+pyserial issues a read() syscall every time its buffer drains; at ~500
+packets/sec that is well over a thousand syscalls per second, which is
+measurable on a Raspberry Pi. io_uring keeps a read request queued with
+the kernel and reaps completions instead, so steady-state reading costs
+one submit+wait pair per buffer.
+
+Needs the 'liburing' package (pip install liburing); the plotter falls
+back to the asyncio reader when it is missing. The port itself is still
+opened and configured by pyserial, which already knows how to set the
+non-standard 250000 baud on Linux - but pyserial leaves the fd
+O_NONBLOCK with VMIN=0, under which every read completes immediately
+with res=0 on an empty buffer and the caller busy-spins. The reader
+therefore reconfigures the fd for blocking reads (VMIN=1) so the queued
+read actually parks in the kernel until data arrives, and restores the
+original settings on close().
+"""
+
+import fcntl
+import os
+import select
+import termios
+
+import liburing
+
+
+class UringSerialReader:
+    """Keeps one read in flight on the port fd and reaps completed buffers."""
+
+    def __init__(self, ser, read_size=4096, queue_depth=8):
+        self.fd = ser.fileno()
+        # Switch the fd from pyserial's polling setup (O_NONBLOCK, VMIN=0)
+        # to blocking semantics: the io_uring read must not complete until
+        # at least one byte is available, otherwise read() degenerates into
+        # a submit+wait spin loop.
+        self._orig_flags = fcntl.fcntl(self.fd, fcntl.F_GETFL)
+        fcntl.fcntl(self.fd, fcntl.F_SETFL, self._orig_flags & ~os.O_NONBLOCK)
+        self._orig_termios = termios.tcgetattr(self.fd)
+        attrs = termios.tcgetattr(self.fd)
+        attrs[6][termios.VMIN] = 1
+        attrs[6][termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+        self._ring = liburing.Ring()
+        liburing.io_uring_queue_init(queue_depth, self._ring)
+        self._cqe = liburing.Cqe()
+        self._buf = bytearray(read_size)
+        self._in_flight = False
+
+    def read(self, timeout=None):
+        """
+        Return the next chunk of received bytes: b"" on timeout, None when
+        the port reports end-of-file (device unplugged or closed).
+
+        The read request is submitted up front and stays queued with the
+        kernel across timeouts, so the buffer can fill while the caller
+        is busy parsing the previous chunk.
+        """
+        if not self._in_flight:
+            sqe = liburing.io_uring_get_sqe(self._ring)
+            liburing.io_uring_prep_read(sqe, self.fd, self._buf)
+            liburing.io_uring_submit(self._ring)
+            self._in_flight = True
+
+        # Wait for the completion with select() on the ring fd rather than
+        # io_uring_wait_cqe_timeout: the binding's wait calls hold the GIL,
+        # so parking inside liburing for the timeout would stall every
+        # other Python thread (including the GUI). select() releases the
+        # GIL, and once the ring fd polls readable the wait below only
+        # reaps an already-finished completion.
+        ready, _, _ = select.select([self._ring.ring_fd], [], [], timeout)
+        if not ready:
+            return b""  # nothing arrived yet; the read stays queued
+
+        liburing.io_uring_wait_cqe(self._ring, self._cqe)
+        n = liburing.trap_error(self._cqe[0].res)
+        liburing.io_uring_cqe_seen(self._ring, self._cqe[0])
+        self._in_flight = False
+        if n == 0:
+            # With VMIN=1 a zero-byte completion can only mean EOF, i.e.
+            # the port went away - not an empty buffer
+            return None
+        return bytes(self._buf[:n])
+
+    def close(self):
+        liburing.io_uring_queue_exit(self._ring)
+        try:
+            # Hand the fd back to pyserial in the state it expects
+            termios.tcsetattr(self.fd, termios.TCSANOW, self._orig_termios)
+            fcntl.fcntl(self.fd, fcntl.F_SETFL, self._orig_flags)
+        except OSError:
+            # Port already gone (e.g. USB unplug) - nothing to restore
+            pass